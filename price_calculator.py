@@ -1,61 +1,112 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
-import json
+from typing import NamedTuple
+import orjson
 import os
 
+HISTORY_FILE = 'calculation_history.jsonl'
+# JSON Lines 전환 이전에 사용하던 전체 목록 형식 파일
+LEGACY_HISTORY_FILE = 'calculation_history.json'
+
+class Inputs(NamedTuple):
+    """단가 계산 입력값"""
+    base_price: float
+    cr: float
+    cr_years: int
+    bl: float
+    payment_before: int
+    payment_after: int
+    annual_interest: float
+
+def _to_serializable(obj):
+    """JSON 기본 직렬화를 지원하지 않는 객체 변환"""
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('list')
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+@st.cache_data(show_spinner=False)
+def _load_history(mtime, legacy_mtime):
+    """저장 파일을 읽는 함수"""
+    # mtime 값들은 캐시 키로만 사용 (파일이 바뀌면 다시 읽음)
+    history = []
+    if legacy_mtime is not None:
+        with open(LEGACY_HISTORY_FILE, 'rb') as f:
+            history.extend(orjson.loads(f.read()))
+    if mtime is not None:
+        with open(HISTORY_FILE, 'rb') as f:
+            history.extend(orjson.loads(line) for line in f if line.strip())
+    return history
+
 def load_saved_results():
     """저장된 결과를 불러오는 함수"""
-    if os.path.exists('calculation_history.json'):
-        with open('calculation_history.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+    mtimes = [os.path.getmtime(path) if os.path.exists(path) else None
+              for path in (HISTORY_FILE, LEGACY_HISTORY_FILE)]
+    return _load_history(*mtimes)
 
 def save_calculation(inputs, results):
     """계산 결과를 저장하는 함수"""
-    history = load_saved_results()
-    
     calculation = {
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'inputs': inputs,
-        'results': results
+        'inputs': inputs._asdict(),
+        'results': {k: v for k, v in results.items() if k != '_fmt'}
     }
     
-    history.append(calculation)
-    
-    with open('calculation_history.json', 'w', encoding='utf-8') as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
-
-def calculate_price_with_cr(base_price, cr, cr_years):
-    """CR 적용된 최종 단가 계산"""
-    cr_rate = 1
-    for _ in range(cr_years):
-        cr_rate *= (1 - cr/100)
-    return base_price / cr_rate
-
-def calculate_price_with_bl(price, bl):
-    """BL 적용"""
-    return price / (1 - bl/100)
-
-def calculate_finance_cost(price, annual_interest, payment_before, payment_after):
-    """금융비용 계산"""
-    daily_interest = annual_interest / 365 / 100
-    delay_days = payment_after - payment_before
-    return price * daily_interest * delay_days
+    payload = orjson.dumps(calculation, default=_to_serializable, option=orjson.OPT_APPEND_NEWLINE)
+    with open(HISTORY_FILE, 'ab') as f:
+        f.write(payload)
+    _load_history.clear()
 
 def calculate_yearly_prices(initial_price, cr, cr_years):
     """연도별 단가 계산"""
-    prices = []
-    current_price = initial_price
+    years = np.arange(1, cr_years + 1)
+    prices = initial_price * (1 - cr/100) ** (years - 1)
+    return pd.DataFrame({'year': years, 'price': prices, 'reduction': cr})
+
+def _compute_final_price(inputs):
+    """CR, BL, 금융비용을 한 번에 계산"""
+    # 1. CR 영향 계산
+    price_with_cr = inputs.base_price
+    if inputs.cr != 0:
+        price_with_cr /= (1 - inputs.cr/100) ** inputs.cr_years
+    # 2. BL 영향 계산
+    price_with_bl = price_with_cr
+    if inputs.bl != 0:
+        price_with_bl /= 1 - inputs.bl/100
+    # 3. 금융비용 계산
+    delay_days = inputs.payment_after - inputs.payment_before
+    finance_cost = price_with_bl * inputs.annual_interest / 36500 * delay_days
+    return price_with_cr, price_with_bl, finance_cost, price_with_bl + finance_cost
+
+@st.cache_data(show_spinner=False)
+def calculate_results(inputs):
+    """입력값으로 전체 결과 계산"""
+    price_with_cr, price_with_bl, finance_cost, final_price = _compute_final_price(inputs)
     
-    for year in range(1, cr_years + 1):
-        prices.append({
-            'year': year,
-            'price': current_price,
-            'reduction': cr
-        })
-        current_price *= (1 - cr/100)
-    return prices
+    # 연도별 단가 계산
+    yearly_prices = calculate_yearly_prices(final_price, inputs.cr, inputs.cr_years)
+    
+    return {
+        'base_with_cr': price_with_cr,
+        'base_with_bl': price_with_bl,
+        'piece_finance_cost': finance_cost,
+        'final_price': final_price,
+        'yearly_prices': yearly_prices,
+        # 화면 표시용 문자열 (계산 시 한 번만 포맷)
+        '_fmt': {
+            'base_price': f"{inputs.base_price:,.0f}원",
+            'base_with_cr': f"{price_with_cr:,.0f}원",
+            'base_with_bl': f"{price_with_bl:,.0f}원",
+            'piece_finance_cost': f"{finance_cost:,.0f}원",
+            'final_price': f"{final_price:,.0f}원"
+        }
+    }
+
+@st.cache_data(show_spinner=False)
+def _styled_html(df, formatter):
+    """포맷이 적용된 표 HTML 생성"""
+    return df.style.format(formatter).to_html()
 
 def main():
     st.title('자동차 부품 단가 계산기')
@@ -65,7 +116,7 @@ def main():
         st.header('기본 정보 입력')
         base_price = st.number_input('기본 단가 (원)', value=10000)
         cr = st.number_input('CR (연간 단가 인하율 %)', value=3.0)
-        cr_years = st.number_input('CR 적용 연수', value=4)
+        cr_years = st.number_input('CR 적용 연수', min_value=0, value=4)
         bl = st.number_input('BL (%)', value=1.0)
         payment_before = st.number_input('대금지급 시작일 (days)', value=60)
         payment_after = st.number_input('대금지급 종료일 (days)', value=120)
@@ -73,38 +124,11 @@ def main():
 
     # 계산 버튼
     if st.sidebar.button('계산하기'):
-        # 1. CR 영향 계산
-        price_with_cr = calculate_price_with_cr(base_price, cr, cr_years)
-        
-        # 2. BL 영향 계산
-        price_with_bl = calculate_price_with_bl(price_with_cr, bl)
-        
-        # 3. 금융비용 계산
-        finance_cost = calculate_finance_cost(price_with_bl, annual_interest, payment_before, payment_after)
-        final_price = price_with_bl + finance_cost
+        inputs = Inputs(base_price, cr, cr_years, bl, payment_before, payment_after, annual_interest)
         
-        # 연도별 단가 계산
-        yearly_prices = calculate_yearly_prices(final_price, cr, cr_years)
-        
-        # 결과를 세션 스테이트에 저장
-        st.session_state.results = {
-            'base_with_cr': price_with_cr,
-            'base_with_bl': price_with_bl,
-            'piece_finance_cost': finance_cost,
-            'final_price': final_price,
-            'yearly_prices': yearly_prices
-        }
-        
-        # 입력값도 저장
-        st.session_state.inputs = {
-            'base_price': base_price,
-            'cr': cr,
-            'cr_years': cr_years,
-            'bl': bl,
-            'payment_before': payment_before,
-            'payment_after': payment_after,
-            'annual_interest': annual_interest
-        }
+        # 결과와 입력값을 세션 스테이트에 저장
+        st.session_state.results = calculate_results(inputs)
+        st.session_state.inputs = inputs
 
     # 결과 표시
     if 'results' in st.session_state:
@@ -115,36 +139,33 @@ def main():
         col1, col2 = st.columns(2)
         
         with col1:
-            st.metric('기본 단가', f"{st.session_state.inputs['base_price']:,.0f}원")
-            st.metric('CR 반영 단가', f"{results['base_with_cr']:,.0f}원")
-            st.metric('BL 반영 단가', f"{results['base_with_bl']:,.0f}원")
+            st.metric('기본 단가', results['_fmt']['base_price'])
+            st.metric('CR 반영 단가', results['_fmt']['base_with_cr'])
+            st.metric('BL 반영 단가', results['_fmt']['base_with_bl'])
         
         with col2:
-            st.metric('개당 금융비용', f"{results['piece_finance_cost']:,.0f}원")
-            st.metric('최종 필요 단가', f"{results['final_price']:,.0f}원")
+            st.metric('개당 금융비용', results['_fmt']['piece_finance_cost'])
+            st.metric('최종 필요 단가', results['_fmt']['final_price'])
         
         # 연도별 단가 예측
         st.subheader('연도별 단가 예측')
-        yearly_df = pd.DataFrame(results['yearly_prices'])
-        yearly_df['price'] = yearly_df['price'].round(2)
-        st.dataframe(yearly_df.style.format({
+        yearly_df = results['yearly_prices'].round({'price': 2})
+        st.markdown(_styled_html(yearly_df, {
             'price': '{:,.0f}원',
             'reduction': '{:.1f}%'
-        }))
+        }), unsafe_allow_html=True)
         
         # 단가 상승 요인 분석
         st.subheader('단가 상승 요인 분석')
-        cr_increase = results['base_with_cr'] - st.session_state.inputs['base_price']
+        cr_increase = results['base_with_cr'] - st.session_state.inputs.base_price
         bl_increase = results['base_with_bl'] - results['base_with_cr']
-        total_increase = results['final_price'] - st.session_state.inputs['base_price']
+        total_increase = results['final_price'] - st.session_state.inputs.base_price
         
-        analysis_df = pd.DataFrame({
+        amounts = [cr_increase, bl_increase, results['piece_finance_cost'], total_increase]
+        st.table({
             '상승 요인': ['CR로 인한 상승', 'BL로 인한 상승', '금융비용', '총 상승분'],
-            '금액': [cr_increase, bl_increase, results['piece_finance_cost'], total_increase]
+            '금액': [f"{amount:+,.0f}원" for amount in amounts]
         })
-        st.dataframe(analysis_df.style.format({
-            '금액': '{:+,.0f}원'
-        }))
         
         # 결과 저장 버튼
         if st.button('결과 저장하기'):
@@ -153,12 +174,18 @@ def main():
         
         # 저장된 결과 보기
         if st.button('저장된 결과 보기'):
+            st.session_state.show_history = True
+        
+        # 선택한 기록 하나만 표시
+        if st.session_state.get('show_history'):
             saved_results = load_saved_results()
             if saved_results:
                 st.subheader('저장된 계산 기록')
-                for idx, calc in enumerate(saved_results, 1):
-                    with st.expander(f"계산 #{idx} - {calc['timestamp']}"):
-                        st.json(calc)
+                idx = st.selectbox(
+                    '기록 선택', range(len(saved_results)), index=len(saved_results) - 1,
+                    format_func=lambda i: f"계산 #{i + 1} - {saved_results[i]['timestamp']}"
+                )
+                st.json(saved_results[idx])
             else:
                 st.info('저장된 계산 결과가 없습니다.')
 
@@ -1,9 +1,9 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import numpy as np
 from datetime import datetime
-import json
+from typing import NamedTuple
+import orjson
 import os
 
 # 페이지 설정
@@ -14,7 +14,7 @@ st.set_page_config(
 )
 
 # CSS 스타일 적용
-st.markdown("""
+PAGE_CSS = """
     <style>
     .main {
         padding: 2rem;
@@ -35,56 +35,74 @@ st.markdown("""
         margin-bottom: 1rem;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
-def load_saved_results():
-    if os.path.exists('calculation_history.json'):
-        with open('calculation_history.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
-def save_calculation(scenario_name, inputs, results):
-    history = load_saved_results()
-    calculation = {
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'scenario_name': scenario_name,
-        'inputs': inputs,
-        'results': results
-    }
-    history.append(calculation)
-    with open('calculation_history.json', 'w', encoding='utf-8') as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
+HISTORY_FILE = 'calculation_history.jsonl'
+# JSON Lines 전환 이전에 사용하던 전체 목록 형식 파일
+LEGACY_HISTORY_FILE = 'calculation_history.json'
 
-def calculate_price_with_cr(base_price, cr, cr_years):
-    cr_rate = 1
-    for _ in range(cr_years):
-        cr_rate *= (1 - cr/100)
-    return base_price / cr_rate
+class Inputs(NamedTuple):
+    base_price: float
+    cr: float
+    cr_years: int
+    bl: float
+    payment_before: int
+    payment_after: int
+    annual_interest: float
 
-def calculate_price_with_bl(price, bl):
-    return price / (1 - bl/100)
+def _to_serializable(obj):
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('list')
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
 
-def calculate_finance_cost(price, annual_interest, payment_before, payment_after):
-    daily_interest = annual_interest / 365 / 100
-    delay_days = payment_after - payment_before
-    return price * daily_interest * delay_days
+@st.cache_data(show_spinner=False)
+def _load_history(mtime, legacy_mtime):
+    # mtime 값들은 캐시 키로만 사용 (파일이 바뀌면 다시 읽음)
+    history = []
+    if legacy_mtime is not None:
+        with open(LEGACY_HISTORY_FILE, 'rb') as f:
+            history.extend(orjson.loads(f.read()))
+    if mtime is not None:
+        with open(HISTORY_FILE, 'rb') as f:
+            history.extend(orjson.loads(line) for line in f if line.strip())
+    return history
+
+def load_saved_results():
+    mtimes = [os.path.getmtime(path) if os.path.exists(path) else None
+              for path in (HISTORY_FILE, LEGACY_HISTORY_FILE)]
+    return _load_history(*mtimes)
+
+def save_calculations(entries):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    payload = b''.join(
+        orjson.dumps({
+            'timestamp': timestamp,
+            'scenario_name': scenario_name,
+            'inputs': inputs._asdict(),
+            'results': {k: v for k, v in results.items() if k != '_fmt'}
+        }, default=_to_serializable, option=orjson.OPT_APPEND_NEWLINE)
+        for scenario_name, inputs, results in entries
+    )
+    with open(HISTORY_FILE, 'ab') as f:
+        f.write(payload)
+    _load_history.clear()
 
 def calculate_yearly_prices(initial_price, cr, cr_years):
-    prices = []
-    current_price = initial_price
-    for year in range(1, cr_years + 1):
-        prices.append({
-            'year': year,
-            'price': current_price,
-            'reduction': cr
-        })
-        current_price *= (1 - cr/100)
-    return prices
+    years = np.arange(1, cr_years + 1)
+    prices = initial_price * (1 - cr/100) ** (years - 1)
+    return pd.DataFrame({'year': years, 'price': prices, 'reduction': cr})
 
+@st.cache_data(show_spinner=False)
 def create_comparison_chart(scenario1, scenario2):
+    # plotly는 차트를 그릴 때만 import (앱 시작 시간 단축)
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
     # 연도별 단가 비교 그래프
-    yearly_prices1 = pd.DataFrame(scenario1['results']['yearly_prices'])
-    yearly_prices2 = pd.DataFrame(scenario2['results']['yearly_prices'])
+    yearly_prices1 = scenario1['results']['yearly_prices']
+    yearly_prices2 = scenario2['results']['yearly_prices']
     
     fig = make_subplots(
         rows=2, cols=1,
@@ -94,12 +112,12 @@ def create_comparison_chart(scenario1, scenario2):
     
     # 연도별 단가 선 그래프
     fig.add_trace(
-        go.Scatter(x=yearly_prices1['year'], y=yearly_prices1['price'],
+        go.Scatter(x=yearly_prices1['year'].to_numpy(), y=yearly_prices1['price'].to_numpy(),
                   name=f"시나리오 1: {scenario1['name']}", line=dict(color='#1f77b4')),
         row=1, col=1
     )
     fig.add_trace(
-        go.Scatter(x=yearly_prices2['year'], y=yearly_prices2['price'],
+        go.Scatter(x=yearly_prices2['year'].to_numpy(), y=yearly_prices2['price'].to_numpy(),
                   name=f"시나리오 2: {scenario2['name']}", line=dict(color='#ff7f0e')),
         row=1, col=1
     )
@@ -107,12 +125,12 @@ def create_comparison_chart(scenario1, scenario2):
     # 상승 요인 분석 막대 그래프
     factors = ['CR 상승', 'BL 상승', '금융비용']
     values1 = [
-        scenario1['results']['base_with_cr'] - scenario1['inputs']['base_price'],
+        scenario1['results']['base_with_cr'] - scenario1['inputs'].base_price,
         scenario1['results']['base_with_bl'] - scenario1['results']['base_with_cr'],
         scenario1['results']['piece_finance_cost']
     ]
     values2 = [
-        scenario2['results']['base_with_cr'] - scenario2['inputs']['base_price'],
+        scenario2['results']['base_with_cr'] - scenario2['inputs'].base_price,
         scenario2['results']['base_with_bl'] - scenario2['results']['base_with_cr'],
         scenario2['results']['piece_finance_cost']
     ]
@@ -137,36 +155,60 @@ def create_comparison_chart(scenario1, scenario2):
     return fig
 
 def input_section(key_suffix):
-    inputs = {}
     with st.container():
         col1, col2 = st.columns(2)
         with col1:
-            inputs['base_price'] = st.number_input('기본 단가 (원)', value=10000, key=f'base_price_{key_suffix}')
-            inputs['cr'] = st.number_input('CR (연간 단가 인하율 %)', value=3.0, key=f'cr_{key_suffix}')
-            inputs['cr_years'] = st.number_input('CR 적용 연수', value=4, key=f'cr_years_{key_suffix}')
-            inputs['bl'] = st.number_input('BL (%)', value=1.0, key=f'bl_{key_suffix}')
+            base_price = st.number_input('기본 단가 (원)', value=10000, key=f'base_price_{key_suffix}')
+            cr = st.number_input('CR (연간 단가 인하율 %)', value=3.0, key=f'cr_{key_suffix}')
+            cr_years = st.number_input('CR 적용 연수', min_value=0, value=4, key=f'cr_years_{key_suffix}')
+            bl = st.number_input('BL (%)', value=1.0, key=f'bl_{key_suffix}')
         with col2:
-            inputs['payment_before'] = st.number_input('대금지급 시작일 (days)', value=60, key=f'payment_before_{key_suffix}')
-            inputs['payment_after'] = st.number_input('대금지급 종료일 (days)', value=120, key=f'payment_after_{key_suffix}')
-            inputs['annual_interest'] = st.number_input('연 이자율 (%)', value=5.0, key=f'annual_interest_{key_suffix}')
-    return inputs
+            payment_before = st.number_input('대금지급 시작일 (days)', value=60, key=f'payment_before_{key_suffix}')
+            payment_after = st.number_input('대금지급 종료일 (days)', value=120, key=f'payment_after_{key_suffix}')
+            annual_interest = st.number_input('연 이자율 (%)', value=5.0, key=f'annual_interest_{key_suffix}')
+    return Inputs(base_price, cr, cr_years, bl, payment_before, payment_after, annual_interest)
 
+def _compute_final_price(inputs):
+    price_with_cr = inputs.base_price
+    if inputs.cr != 0:
+        price_with_cr /= (1 - inputs.cr/100) ** inputs.cr_years
+    price_with_bl = price_with_cr
+    if inputs.bl != 0:
+        price_with_bl /= 1 - inputs.bl/100
+    delay_days = inputs.payment_after - inputs.payment_before
+    finance_cost = price_with_bl * inputs.annual_interest / 36500 * delay_days
+    return price_with_cr, price_with_bl, finance_cost, price_with_bl + finance_cost
+
+@st.cache_data(show_spinner=False)
 def calculate_results(inputs):
-    price_with_cr = calculate_price_with_cr(inputs['base_price'], inputs['cr'], inputs['cr_years'])
-    price_with_bl = calculate_price_with_bl(price_with_cr, inputs['bl'])
-    finance_cost = calculate_finance_cost(price_with_bl, inputs['annual_interest'], 
-                                       inputs['payment_before'], inputs['payment_after'])
-    final_price = price_with_bl + finance_cost
-    yearly_prices = calculate_yearly_prices(final_price, inputs['cr'], inputs['cr_years'])
+    price_with_cr, price_with_bl, finance_cost, final_price = _compute_final_price(inputs)
+    yearly_prices = calculate_yearly_prices(final_price, inputs.cr, inputs.cr_years)
     
     return {
         'base_with_cr': price_with_cr,
         'base_with_bl': price_with_bl,
         'piece_finance_cost': finance_cost,
         'final_price': final_price,
-        'yearly_prices': yearly_prices
+        'yearly_prices': yearly_prices,
+        # 화면 표시용 문자열 (계산 시 한 번만 포맷)
+        '_fmt': {
+            'base_price': f"{inputs.base_price:,.0f}원",
+            'base_with_cr': f"{price_with_cr:,.0f}원",
+            'base_with_bl': f"{price_with_bl:,.0f}원",
+            'piece_finance_cost': f"{finance_cost:,.0f}원",
+            'final_price': f"{final_price:,.0f}원",
+            'total_increase': f"{final_price - inputs.base_price:,.0f}원"
+        }
     }
 
+@st.cache_data(show_spinner=False)
+def _styled_html(df, formatter):
+    # 시나리오 이름 등 사용자 입력이 헤더에 들어가므로 HTML 이스케이프
+    return (df.style
+            .format(formatter, na_rep='-', escape='html')
+            .format_index(escape='html', axis=1)
+            .to_html())
+
 def display_metrics(scenario1, scenario2):
     col1, col2 = st.columns(2)
     
@@ -177,13 +219,13 @@ def display_metrics(scenario1, scenario2):
         with metrics1:
             subcol1, subcol2 = st.columns(2)
             with subcol1:
-                st.metric("기본 단가", f"{scenario1['inputs']['base_price']:,.0f}원")
-                st.metric("CR 반영 단가", f"{results1['base_with_cr']:,.0f}원")
-                st.metric("BL 반영 단가", f"{results1['base_with_bl']:,.0f}원")
+                st.metric("기본 단가", results1['_fmt']['base_price'])
+                st.metric("CR 반영 단가", results1['_fmt']['base_with_cr'])
+                st.metric("BL 반영 단가", results1['_fmt']['base_with_bl'])
             with subcol2:
-                st.metric("개당 금융비용", f"{results1['piece_finance_cost']:,.0f}원")
-                st.metric("최종 필요 단가", f"{results1['final_price']:,.0f}원", 
-                         delta=f"{results1['final_price'] - scenario1['inputs']['base_price']:,.0f}원")
+                st.metric("개당 금융비용", results1['_fmt']['piece_finance_cost'])
+                st.metric("최종 필요 단가", results1['_fmt']['final_price'], 
+                         delta=results1['_fmt']['total_increase'])
     
     with col2:
         st.markdown(f"### 시나리오 2: {scenario2['name']}")
@@ -192,13 +234,13 @@ def display_metrics(scenario1, scenario2):
         with metrics2:
             subcol1, subcol2 = st.columns(2)
             with subcol1:
-                st.metric("기본 단가", f"{scenario2['inputs']['base_price']:,.0f}원")
-                st.metric("CR 반영 단가", f"{results2['base_with_cr']:,.0f}원")
-                st.metric("BL 반영 단가", f"{results2['base_with_bl']:,.0f}원")
+                st.metric("기본 단가", results2['_fmt']['base_price'])
+                st.metric("CR 반영 단가", results2['_fmt']['base_with_cr'])
+                st.metric("BL 반영 단가", results2['_fmt']['base_with_bl'])
             with subcol2:
-                st.metric("개당 금융비용", f"{results2['piece_finance_cost']:,.0f}원")
-                st.metric("최종 필요 단가", f"{results2['final_price']:,.0f}원",
-                         delta=f"{results2['final_price'] - scenario2['inputs']['base_price']:,.0f}원")
+                st.metric("개당 금융비용", results2['_fmt']['piece_finance_cost'])
+                st.metric("최종 필요 단가", results2['_fmt']['final_price'],
+                         delta=results2['_fmt']['total_increase'])
 
 def main():
     st.title('🚗 자동차 부품 단가 계산기')
@@ -222,9 +264,15 @@ def main():
         inputs2 = input_section('scenario2')
         
         if st.button('계산하기', key='calculate_comparison'):
-            # 결과 계산
-            results1 = calculate_results(inputs1)
-            results2 = calculate_results(inputs2)
+            # 결과 계산 (입력값이 이전 계산과 같으면 기존 결과 재사용)
+            inputs_key = (inputs1, inputs2)
+            if st.session_state.get('last_inputs_key') == inputs_key:
+                results1 = st.session_state.scenario1['results']
+                results2 = st.session_state.scenario2['results']
+            else:
+                results1 = calculate_results(inputs1)
+                results2 = calculate_results(inputs2)
+                st.session_state.last_inputs_key = inputs_key
             
             # 세션 스테이트에 저장
             st.session_state.scenario1 = {
@@ -246,68 +294,69 @@ def main():
             st.markdown("### 📈 시각화")
             fig = create_comparison_chart(st.session_state.scenario1, st.session_state.scenario2)
             st.plotly_chart(fig, use_container_width=True)
-            
-            # 저장 버튼
+        
+        # 저장 버튼 (계산하기 버튼 밖에 두어야 클릭 후 다시 실행될 때도 동작)
+        if 'scenario1' in st.session_state and 'scenario2' in st.session_state:
             if st.button('결과 저장하기'):
-                save_calculation(scenario1_name, inputs1, results1)
-                save_calculation(scenario2_name, inputs2, results2)
+                scenario1 = st.session_state.scenario1
+                scenario2 = st.session_state.scenario2
+                save_calculations([
+                    (scenario1['name'], scenario1['inputs'], scenario1['results']),
+                    (scenario2['name'], scenario2['inputs'], scenario2['results'])
+                ])
                 st.success('두 시나리오의 계산 결과가 저장되었습니다!')
     
     with tab2:
         if 'scenario1' in st.session_state and 'scenario2' in st.session_state:
             st.markdown("## 상세 분석")
             
-            # 연도별 단가 예측 테이블
-            st.markdown("### 📅 연도별 단가 예측")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown(f"#### {st.session_state.scenario1['name']}")
-                yearly_df1 = pd.DataFrame(st.session_state.scenario1['results']['yearly_prices'])
-                st.dataframe(yearly_df1.style.format({
-                    'price': '{:,.0f}원',
-                    'reduction': '{:.1f}%'
-                }))
+            scenario1 = st.session_state.scenario1
+            scenario2 = st.session_state.scenario2
+            label1 = f"시나리오 1: {scenario1['name']}"
+            label2 = f"시나리오 2: {scenario2['name']}"
             
-            with col2:
-                st.markdown(f"#### {st.session_state.scenario2['name']}")
-                yearly_df2 = pd.DataFrame(st.session_state.scenario2['results']['yearly_prices'])
-                st.dataframe(yearly_df2.style.format({
-                    'price': '{:,.0f}원',
-                    'reduction': '{:.1f}%'
-                }))
+            # 연도별 단가 예측 테이블 (두 시나리오를 연도 기준으로 합쳐 한 번에 표시)
+            st.markdown("### 📅 연도별 단가 예측")
+            combined_df = pd.concat({
+                label1: scenario1['results']['yearly_prices'].set_index('year'),
+                label2: scenario2['results']['yearly_prices'].set_index('year')
+            }, axis=1)
+            formatter = {}
+            for label in (label1, label2):
+                formatter[(label, 'price')] = '{:,.0f}원'
+                formatter[(label, 'reduction')] = '{:.1f}%'
+            st.markdown(_styled_html(combined_df, formatter), unsafe_allow_html=True)
             
             # 상승 요인 분석
             st.markdown("### 📈 단가 상승 요인 분석")
-            col1, col2 = st.columns(2)
             
-            def create_analysis_df(scenario):
+            def format_increases(scenario):
                 results = scenario['results']
                 inputs = scenario['inputs']
-                cr_increase = results['base_with_cr'] - inputs['base_price']
+                cr_increase = results['base_with_cr'] - inputs.base_price
                 bl_increase = results['base_with_bl'] - results['base_with_cr']
-                total_increase = results['final_price'] - inputs['base_price']
-                
-                return pd.DataFrame({
-                    '상승 요인': ['CR로 인한 상승', 'BL로 인한 상승', '금융비용', '총 상승분'],
-                    '금액': [cr_increase, bl_increase, results['piece_finance_cost'], total_increase]
-                })
-            
-            with col1:
-                st.markdown(f"#### {st.session_state.scenario1['name']}")
-                analysis_df1 = create_analysis_df(st.session_state.scenario1)
-                st.dataframe(analysis_df1.style.format({
-                    '금액': '{:+,.0f}원'
-                }))
+                total_increase = results['final_price'] - inputs.base_price
+                amounts = [cr_increase, bl_increase, results['piece_finance_cost'], total_increase]
+                return [f"{amount:+,.0f}원" for amount in amounts]
             
-            with col2:
-                st.markdown(f"#### {st.session_state.scenario2['name']}")
-                analysis_df2 = create_analysis_df(st.session_state.scenario2)
-                st.dataframe(analysis_df2.style.format({
-                    '금액': '{:+,.0f}원'
-                }))
+            st.table({
+                '상승 요인': ['CR로 인한 상승', 'BL로 인한 상승', '금융비용', '총 상승분'],
+                label1: format_increases(scenario1),
+                label2: format_increases(scenario2)
+            })
         else:
             st.info('먼저 시나리오 비교 탭에서 계산을 진행해주세요.')
     
     with tab3:
-        st
\ No newline at end of file
+        saved_results = load_saved_results()
+        if saved_results:
+            idx = st.selectbox(
+                '기록 선택', range(len(saved_results)), index=len(saved_results) - 1,
+                format_func=lambda i: f"#{i + 1} {saved_results[i]['timestamp']} {saved_results[i].get('scenario_name', '')}"
+            )
+            st.json(saved_results[idx])
+        else:
+            st.info('저장된 계산 결과가 없습니다.')
+
+if __name__ == '__main__':
+    main()